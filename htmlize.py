@@ -1,23 +1,19 @@
 import html
+import mmap
+import os
+import re
+import time
+from contextlib import contextmanager
 
-def generate_html():
-    # Read the response from response.txt
-    try:
-        with open('response.txt', 'r') as file:
-            content = file.read()
-    except FileNotFoundError:
-        print("Error: response.txt file not found.")
-        return
-    except IOError:
-        print("Error: Unable to read response.txt file.")
-        return
+import orjson
 
-    # Split the content into response and summary
-    parts = content.split("SUMMARY OF PROCESS")
-    response = parts[0].strip()
-    summary = parts[1].strip() if len(parts) > 1 else ""
+# Escaping and markdown conversion in a single pass: bold spans, paragraph breaks, line breaks
+# and the characters html.escape would replace are all matched by _MARKUP_RE
+_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'}
+_ESCAPE_TABLE = str.maketrans(_ESCAPES)
+_MARKUP_RE = re.compile(r'\*\*(.+?)\*\*|\n\n|\n|[&<>"\']')
 
-    html_content = f"""
+HTML_HEAD = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -25,22 +21,45 @@ def generate_html():
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>COT Python Script Response</title>
         <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; padding: 20px; }}
-            h1, h2 {{ color: #333; }}
-            .section {{ background-color: #f0f0f0; padding: 15px; margin-bottom: 20px; }}
-            .section p {{ font-size: 0.9em; }}
-            .metadata {{ font-weight: bold; margin-left: 20px; }}
+            body { font-family: Arial, sans-serif; line-height: 1.6; padding: 20px; }
+            h1, h2 { color: #333; }
+            .section { background-color: #f0f0f0; padding: 15px; margin-bottom: 20px; }
+            .section p { font-size: 0.9em; }
+            .metadata { font-weight: bold; margin-left: 20px; }
         </style>
     </head>
     <body>
         <h1>COT Python Script Response</h1>
         <div class="section">
             <h2>Response</h2>
-            <p>{html.escape(response).replace('**', '<strong>').replace('</strong>**', '</strong>').replace('\n\n', '</p><p>').replace('\n', '<br>')}</p>
+"""
+
+HTML_MIDDLE = """
         </div>
         <div class="section">
             <h2>Summary of Process</h2>
-            <p>{html.escape(summary).replace('**', '<strong>').replace('</strong>**', '</strong>').replace('\n\n', '</p><p>').replace('\n', '<br>')}</p>
+"""
+
+SUMMARY_HEAD = """            <p><strong>Run started:</strong> {started}</p>
+            <p><strong>Total time taken for the process:</strong> {total_time:.2f} seconds</p>
+            <p><strong>Feedback and grading time (last iteration):</strong> {review_time:.2f} seconds</p>
+"""
+
+SUMMARY_RESPONSE = """            <h3>Response {number}</h3>
+            <p><strong>Response:</strong> {response}</p>
+            <p><strong>Feedback:</strong> {feedback}</p>
+            <p><strong>Grade:</strong> {grade}</p>
+            <p><strong>Response generation time:</strong> {time_taken:.2f} seconds</p>
+"""
+
+SUMMARY_BEST = """            <h3>Best response: response {number} (Grade: {grade})</h3>
+            <p>{response}</p>
+"""
+
+SUMMARY_MISSING = """            <p>The run did not finish, there is no summary.json to summarize.</p>
+"""
+
+HTML_TAIL = """
         </div>
         <div class="metadata">
             <p><strong>Model:</strong> meta.llama3-70b-instruct-v1:0</p>
@@ -52,14 +71,124 @@ def generate_html():
     </body>
     </html>
     """
-    
-    # Write the HTML content to response.html
+
+def _markup(match):
+    bold = match.group(1)
+    if bold is not None:
+        return f'<strong>{bold.translate(_ESCAPE_TABLE)}</strong>'
+    token = match.group(0)
+    if token == '\n\n':
+        return '</p><p>'
+    if token == '\n':
+        return '<br>'
+    return _ESCAPES[token]
+
+def _to_html(text):
+    return _MARKUP_RE.sub(_markup, text)
+
+def _records(content):
+    """
+    Yield the records of a JSONL log one line at a time.
+    """
+    start = 0
+    while start < len(content):
+        end = content.find(b"\n", start)
+        if end == -1:
+            end = len(content)
+        line = content[start:end].strip()
+        if line:
+            yield orjson.loads(line)
+        start = end + 1
+
+def _record_html(record):
+    """
+    Render one record of response.jsonl as a heading and paragraph.
+    """
+    if record['kind'] == "response":
+        title = f"Response {record['id'] + 1}"
+        text = record['text']
+    elif record['kind'] == "review":
+        title = f"Iteration {record['iter'] + 1}: feedback for response {record['id'] + 1} (Grade: {record['grade']})"
+        text = record['feedback']
+    else:
+        title = f"Iteration {record['iter'] + 1}: refined response {record['id'] + 1}"
+        text = record['text']
+    return f"<h3>{html.escape(title)} ({record['elapsed']:.2f} seconds)</h3><p>{_to_html(text.strip())}</p>\n"
+
+def _summary_html(summary):
+    """
+    Render summary.json. Only the model generated text needs escaping, the numbers are
+    formatted straight into the template. Responses are numbered by id, matching the log.
+    """
+    parts = [SUMMARY_HEAD.format(
+        started=time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(summary['started'])),
+        total_time=summary['total_time'],
+        review_time=summary['review_time']
+    )]
+    for r in summary['responses']:
+        parts.append(SUMMARY_RESPONSE.format(
+            number=r['id'] + 1,
+            response=_to_html(r['response'].strip()),
+            feedback=_to_html(r['feedback'].strip()),
+            grade=r['grade'],
+            time_taken=r['time_taken']
+        ))
+    best = summary['best']
+    parts.append(SUMMARY_BEST.format(number=best['id'] + 1, grade=best['grade'], response=_to_html(best['response'].strip())))
+    return "".join(parts)
+
+def _write_html(records, summary):
+    """
+    Stream the HTML for records (the bytes of response.jsonl) and summary (the contents of
+    summary.json, or None if the run did not finish) into response.html.
+    """
     try:
-        with open('response.html', 'w') as f:
-            f.write(html_content)
+        with open('response.html', 'w', encoding='utf-8') as f:
+            f.write(HTML_HEAD)
+            for record in _records(records):
+                f.write(_record_html(record))
+            f.write(HTML_MIDDLE)
+            f.write(_summary_html(summary) if summary is not None else SUMMARY_MISSING)
+            f.write(HTML_TAIL)
         print("HTML file 'response.html' has been generated successfully.")
     except IOError:
         print("Error: Unable to write to response.html file.")
 
+@contextmanager
+def _mapped(path):
+    """
+    Memory-map path for reading, so only the pages being converted are resident.
+    """
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # mmap cannot map an empty file
+            yield b""
+        else:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                yield content
+
+def _load_summary():
+    """
+    Return the contents of summary.json, or None if it is missing. redfruit.py removes it at
+    the start of a run and writes it at the end, so a crashed run leaves only its log.
+    """
+    try:
+        with open('summary.json', 'rb') as file:
+            return orjson.loads(file.read())
+    except FileNotFoundError:
+        print("Warning: summary.json file not found, the run did not finish. Rendering the log only.")
+        return None
+
+def generate_html():
+    try:
+        with _mapped('response.jsonl') as records:
+            _write_html(records, _load_summary())
+    except FileNotFoundError as err:
+        print(f"Error: {err.filename} file not found.")
+        return
+    except IOError:
+        print("Error: Unable to read response.jsonl or summary.json file.")
+        return
+
 # Run the function to generate the HTML file
-generate_html()
\ No newline at end of file
+generate_html()
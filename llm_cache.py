@@ -0,0 +1,40 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import orjson
+
+# Cache location, shared across runs
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'redfruit')
+DB_PATH = os.path.join(CACHE_DIR, 'llm.sqlite')
+
+# Set to False (redfruit.py --no-cache) to always call the model
+enabled = True
+
+def _connect():
+    """
+    Open the cache database, creating it on first use.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value BLOB, ts INTEGER)")
+    return conn
+
+def get(key):
+    """
+    Return the cached response dict for key, or None on a miss.
+    """
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+    return orjson.loads(row[0]) if row else None
+
+def set(key, value):
+    """
+    Store the response dict value under key.
+    """
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, ts) VALUES (?, ?, ?)",
+            (key, orjson.dumps(value), int(time.time()))
+        )
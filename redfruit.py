@@ -1,32 +1,190 @@
+import os
 import re
+import orjson
+import hashlib
 import logging
-import boto3
+import argparse
+import asyncio
+import collections
+import aioboto3
+from aiolimiter import AsyncLimiter
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import time
 
+import llm_cache
+import semantic_cache
+
 # Setup logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def generate_conversation(bedrock_client, model_id, system_prompts, messages, max_gen_len):
+# Task instructions are sent as system content ahead of the variable text, so every call
+# of a given kind shares the same prompt prefix and can hit the provider's prompt cache
+GRADING_INSTRUCTION = ("Grade the response given by the user on a scale from -100 to 100 based on the feedback. "
+                       "Reply with only the grade, in the form '<n> out of 100'.")
+REVIEW_INSTRUCTION = ("First, provide critical feedback for the answer given by the user, starting with 'FEEDBACK:'. "
+                      "Then on a new line output 'GRADE: <n>' where n is an integer from -100 to 100.")
+BATCH_REVIEW_INSTRUCTION = ("Provide critical feedback and a grade from -100 to 100 for each of the numbered answers given by the user. "
+                            "Output a JSON array with one object per answer, in order: "
+                            "{\"idx\": <answer number>, \"feedback\": \"<feedback>\", \"grade\": <integer grade>}.")
+REFINEMENT_INSTRUCTION = "Refine the response given by the user to make it more concise and technical but retain information."
+
+# Models that support Converse API prompt caching, others reject cachePoint blocks
+PROMPT_CACHE_MODELS = ("anthropic.claude", "amazon.nova")
+
+# Models that accept stopSequences through the Converse API, others are sent none and rely
+# on maxTokens to bound the reply
+STOP_SEQUENCE_MODELS = ("anthropic.claude", "amazon.nova", "amazon.titan", "cohere.command", "mistral.")
+
+# Grade parsing patterns. A \b before the signed number would drop the "-" of negative grades,
+# the digit lookarounds instead keep "1000" from matching as "000" or "100"
+_GRADE_RE = re.compile(r'(?<!\d)(-?\d{1,3})(?=\s*out\s*of\s*100)')
+_REVIEW_FEEDBACK_RE = re.compile(r'(?s)FEEDBACK:\s*(.*?)\n\s*GRADE:')
+_REVIEW_GRADE_RE = re.compile(r'GRADE:\s*(-?\d{1,3})(?!\d)')
+# Fallback for batch replies that are not a valid JSON array, it breaks on braces inside feedback
+_REVIEW_OBJECT_RE = re.compile(r'\{.*?\}', re.S)
+
+# Cap on in-flight Bedrock requests, to stay within the model's TPS quota
+MAX_CONCURRENCY = 8
+_bedrock_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+# Per-minute request and token quotas of the model. Calls over the quota wait here instead
+# of being throttled by Bedrock and retried
+REQUESTS_PER_MINUTE = 400
+TOKENS_PER_MINUTE = 300000
+_request_limiter = AsyncLimiter(REQUESTS_PER_MINUTE, 60)
+_token_usage = collections.deque()  # [time, tokens] of the calls in the last minute, estimated until they finish
+
+def _estimate_tokens(request):
+    """
+    Estimate the total tokens of a request before it is sent: its output limit plus roughly
+    four characters per prompt token.
+    """
+    prompt_chars = sum(len(block.get('text', '')) for block in request.get('system', []))
+    prompt_chars += sum(len(block.get('text', '')) for message in request['messages'] for block in message['content'])
+    return request['inferenceConfig']['maxTokens'] + prompt_chars // 4
+
+async def _reserve_tokens(estimate):
+    """
+    Wait until estimate more tokens fit in the last minute's TOKENS_PER_MINUTE, then record
+    them and return the entry, to be settled with the actual usage once the call finishes.
+    A call is always allowed when nothing else was sent in the last minute.
+    """
+    while True:
+        now = time.monotonic()
+        while _token_usage and now - _token_usage[0][0] >= 60:
+            _token_usage.popleft()
+        if not _token_usage or sum(tokens for _, tokens in _token_usage) + estimate <= TOKENS_PER_MINUTE:
+            # No await between the check and the append, so concurrent calls cannot overbook
+            entry = [now, estimate]
+            _token_usage.append(entry)
+            return entry
+        await asyncio.sleep(60 - (now - _token_usage[0][0]))
+
+async def _converse_stream(bedrock_client, **request):
+    """
+    Call converse_stream and assemble its events into the response shape converse returns.
+    Text deltas are collected in a list and joined once at the end.
+    """
+    chunks = []
+    response = {}
+    async with _request_limiter, _bedrock_semaphore:
+        # Reserved inside the semaphore, so the budget is checked against every call in flight
+        reservation = await _reserve_tokens(_estimate_tokens(request))
+        stream_response = await bedrock_client.converse_stream(**request)
+        async for event in stream_response['stream']:
+            if 'contentBlockDelta' in event:
+                text = event['contentBlockDelta']['delta'].get('text', '')
+                logger.debug(f"Partial response: {text}")
+                chunks.append(text)
+            elif 'messageStop' in event:
+                response['stopReason'] = event['messageStop']['stopReason']
+            elif 'metadata' in event:
+                response['usage'] = event['metadata']['usage']
+    reservation[1] = response['usage']['totalTokens']
+    response['output'] = {"message": {"role": "assistant", "content": [{"text": "".join(chunks)}]}}
+    return response
+
+def _reply_text(response):
+    return response['output']['message']['content'][0]['text']
+
+async def generate_conversation(bedrock_client, model_id, system_prompts, messages, max_gen_len, temperature=0.5, top_p=0.9, stop_sequences=None,
+                                semantic=False, cache_check=None):
     """
     Sends messages to a model and returns the generated response.
+    The response is streamed from the model and returned in the shape converse returns.
+    Deterministic (temperature 0) requests are served from the exact-match cache before
+    falling back to the model. Pass semantic=True to also serve the request from the semantic
+    cache of near-duplicate prompts, at any temperature. Only do so where a reply to a similar
+    prompt is as good as a fresh one, such as a refinement, and never for a grade.
+    cache_check, if given, is called with the reply text and only replies it accepts are
+    cached, so a reply the caller cannot parse is not replayed on every later run.
     """
     logger.info(f"Generating message with model {model_id}")
 
     # Inference parameters
-    temperature = 0.5
-    top_p = 0.9
     max_tokens = max_gen_len  # Limit response to max_gen_len tokens
 
     inference_config = {"temperature": temperature, "maxTokens": max_tokens}
+    if not any(name in model_id for name in STOP_SEQUENCE_MODELS):
+        stop_sequences = None
+    if stop_sequences:
+        inference_config["stopSequences"] = stop_sequences
     additional_model_fields = {"top_p": top_p}
 
+    # Only deterministic responses are cached exactly, sampled ones would be replayed forever.
+    # The semantic cache is opted into by the caller and has its own gate
+    use_cache = llm_cache.enabled and temperature == 0
+    use_semantic_cache = semantic and llm_cache.enabled and semantic_cache.available()
+    if use_cache:
+        cache_key = hashlib.sha256(orjson.dumps({
+            "model_id": model_id,
+            "system_prompts": system_prompts,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+            "stop_sequences": stop_sequences
+        }, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        # SQLite access blocks, keep it off the event loop
+        cached = await asyncio.to_thread(llm_cache.get, cache_key)
+        if cached is not None and cache_check is not None and not cache_check(_reply_text(cached)):
+            logger.warning(f"Discarding unusable cached response for {cache_key[:12]}")
+            cached = None
+        if cached is not None:
+            logger.info(f"Cache hit for {cache_key[:12]}")
+            return cached
+
+    # Near-duplicate prompts only match requests with the same system prompt and limits,
+    # so a cached response of the wrong shape is never returned
+    if use_semantic_cache:
+        prompt_text = "\n".join(c['text'] for m in messages for c in m['content'] if 'text' in c)
+        shape = hashlib.sha256(orjson.dumps({
+            "model_id": model_id,
+            "system_prompts": system_prompts,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+            "stop_sequences": stop_sequences
+        }, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        # Embedding the prompt is CPU bound, keep it off the event loop
+        cached = await asyncio.to_thread(semantic_cache.get, prompt_text, shape)
+        if cached is not None and (cache_check is None or cache_check(_reply_text(cached))):
+            logger.info(f"Semantic cache hit for {shape[:12]}")
+            return cached
+
+    # Mark the end of the invariant system prefix as cacheable where the model supports it
+    system = system_prompts
+    if any(name in model_id for name in PROMPT_CACHE_MODELS):
+        system = system_prompts + [{"cachePoint": {"type": "default"}}]
+
     # Send the message to the model
-    response = bedrock_client.converse(
+    response = await _converse_stream(
+        bedrock_client,
         modelId=model_id,
         messages=messages,
-        system=system_prompts,
+        system=system,
         inferenceConfig=inference_config,
         additionalModelRequestFields=additional_model_fields
     )
@@ -36,43 +194,156 @@ def generate_conversation(bedrock_client, model_id, system_prompts, messages, ma
     logger.info(f"Input tokens: {token_usage['inputTokens']}")
     logger.info(f"Output tokens: {token_usage['outputTokens']}")  # Fix: Corrected the case of the key
     logger.info(f"Total tokens: {token_usage['totalTokens']}")
+    logger.info(f"Cache read input tokens: {token_usage.get('cacheReadInputTokens', 0)}")
     logger.info(f"Stop reason: {response['stopReason']}")
 
-    return response
+    if (use_cache or use_semantic_cache) and (cache_check is None or cache_check(_reply_text(response))):
+        cached = {k: response[k] for k in ('output', 'usage', 'stopReason')}
+        if use_cache:
+            await asyncio.to_thread(llm_cache.set, cache_key, cached)
+        if use_semantic_cache:
+            await asyncio.to_thread(semantic_cache.set, prompt_text, shape, cached)
 
-def get_feedback(bedrock_client, model_id, response, system_prompts):
-    """
-    Ask the model to provide feedback for the generated response.
-    """
-    feedback_prompt = {
-        "role": "user",
-        "content": [{"text": f"Provide critical feedback for the following answer:\n\n{response}"}]
-    }
-    feedback_response = generate_conversation(bedrock_client, model_id, system_prompts, [feedback_prompt], max_gen_len=512)
-    return feedback_response['output']['message']['content'][0]['text']
+    return response
 
-def grade_response(bedrock_client, model_id, response, feedback, system_prompts):
+async def grade_response(bedrock_client, model_id, response, feedback, system_prompts):
     """
     Ask the model to grade the response on a scale from -100 to 100.
     """
     grading_prompt = {
         "role": "user",
-        "content": [{"text": f"Grade the following response on a scale from -100 to 100 based on the feedback:\n\nResponse: {response}\nFeedback: {feedback}"}]
+        "content": [{"text": f"Response: {response}\nFeedback: {feedback}"}]
     }
-    grading_response = generate_conversation(bedrock_client, model_id, system_prompts, [grading_prompt], max_gen_len=100)
+    grading_system_prompts = system_prompts + [{"text": GRADING_INSTRUCTION}]
+    # The reply is a single "<n> out of 100", so keep the budget tight and stop at the first line
+    # break. Grading is deterministic, which also makes it eligible for the response cache
+    grading_response = await generate_conversation(bedrock_client, model_id, grading_system_prompts, [grading_prompt], max_gen_len=16,
+                                                   temperature=0.0, stop_sequences=["\n\n", "\n"],
+                                                   cache_check=lambda text: _GRADE_RE.search(text) is not None)
     
     # Extract the number from the response text
-    grading_text = grading_response['output']['message']['content'][0]['text'].strip()
+    grading_text = _reply_text(grading_response).strip()
     logger.info(f"Grading response: {grading_text}")
 
     # Use regex to extract the correct grade (ignoring "100")
-    match = re.search(r'(\b-?\d{1,3}\b)(?=\s*out\s*of\s*100)', grading_text)
+    match = _GRADE_RE.search(grading_text)
     if match:
-        return int(match.group(0))  # Return the first matched number, which is the grade
+        return int(match.group(1))  # Return the first matched number, which is the grade
     else:
         raise ValueError(f"Could not extract a valid grade from the response: {grading_text}")
 
-def main(num_iterations):
+async def get_feedback_and_grade(bedrock_client, model_id, response, system_prompts):
+    """
+    Ask the model for critical feedback and a grade from -100 to 100 in a single call.
+    Returns a (feedback, grade) tuple.
+    """
+    review_prompt = {
+        "role": "user",
+        "content": [{"text": response}]
+    }
+    review_system_prompts = system_prompts + [{"text": REVIEW_INSTRUCTION}]
+    review_response = await generate_conversation(bedrock_client, model_id, review_system_prompts, [review_prompt], max_gen_len=600, temperature=0.0,
+                                                  cache_check=lambda text: _REVIEW_GRADE_RE.search(text) is not None)
+    review_text = _reply_text(review_response).strip()
+    logger.info(f"Review response: {review_text}")
+
+    feedback_match = _REVIEW_FEEDBACK_RE.search(review_text)
+    feedback = feedback_match.group(1).strip() if feedback_match else review_text
+
+    grade_match = _REVIEW_GRADE_RE.search(review_text)
+    if grade_match:
+        return feedback, int(grade_match.group(1))
+
+    # The model ignored the output format; grade separately using the feedback we have
+    logger.warning("No GRADE line in the review response, falling back to a separate grading call")
+    return feedback, await grade_response(bedrock_client, model_id, response, feedback, system_prompts)
+
+def _parse_batch_reviews(batch_text, count):
+    """
+    Return {idx: (feedback, grade)} for the valid reviews in a batch review reply of count
+    responses. The outermost JSON array is parsed first, objects are only matched one by one
+    if it is not valid JSON. Reviews with an unknown idx or a grade outside -100..100 are dropped.
+    """
+    try:
+        candidates = orjson.loads(batch_text[batch_text.find('['):batch_text.rfind(']') + 1])
+    except orjson.JSONDecodeError:
+        candidates = []
+        for review_text in _REVIEW_OBJECT_RE.findall(batch_text):
+            try:
+                candidates.append(orjson.loads(review_text))
+            except orjson.JSONDecodeError:
+                continue
+
+    reviews = {}
+    for review in candidates:
+        try:
+            idx = int(review['idx'])
+            grade = int(review['grade'])
+            feedback = str(review['feedback']).strip()
+        except (ValueError, KeyError, TypeError):
+            continue
+        if 0 <= idx < count and -100 <= grade <= 100:
+            reviews[idx] = (feedback, grade)
+    return reviews
+
+async def batch_feedback_and_grade(bedrock_client, model_id, responses, system_prompts):
+    """
+    Ask the model for feedback and a grade for every response in a single call.
+    Returns a list of (feedback, grade) tuples in the order of responses. Responses the reply
+    does not cover are reviewed one by one with get_feedback_and_grade.
+    """
+    batch_prompt = {
+        "role": "user",
+        "content": [{"text": "\n\n".join(f"[{i}]\n{response}" for i, response in enumerate(responses))}]
+    }
+    batch_system_prompts = system_prompts + [{"text": BATCH_REVIEW_INSTRUCTION}]
+    # Only cache a reply that covers every response, a partial one would force the separate
+    # reviews again on every later run
+    batch_response = await generate_conversation(bedrock_client, model_id, batch_system_prompts, [batch_prompt], max_gen_len=1024, temperature=0.0,
+                                                 cache_check=lambda text: len(_parse_batch_reviews(text, len(responses))) == len(responses))
+    batch_text = _reply_text(batch_response).strip()
+    logger.info(f"Batch review response: {batch_text}")
+
+    reviews = _parse_batch_reviews(batch_text, len(responses))
+
+    missing = [i for i in range(len(responses)) if i not in reviews]
+    if missing:
+        logger.warning(f"Batch review did not cover responses {missing}, reviewing them separately")
+        fallbacks = await asyncio.gather(*[get_feedback_and_grade(bedrock_client, model_id, responses[i], system_prompts) for i in missing])
+        reviews.update(zip(missing, fallbacks))
+
+    return [reviews[i] for i in range(len(responses))]
+
+async def _timed(fn, *args, **kwargs):
+    """
+    Await fn(*args, **kwargs) and return a (result, elapsed seconds) tuple.
+    """
+    start_time = time.perf_counter()
+    result = await fn(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+def _summarize_log(path):
+    """
+    Rebuild the final state of every response from the run log, best ranked first.
+    """
+    final = {}
+    ranks = {}
+    with open(path, 'rb') as log:
+        for line in log:
+            record = orjson.loads(line)
+            r = final.setdefault(record['id'], {"id": record['id'], "feedback": None, "grade": None})
+            if record['kind'] == "response":
+                r['response'] = record['text']
+                r['time_taken'] = record['elapsed']
+            elif record['kind'] == "review":
+                r['feedback'] = record['feedback']
+                r['grade'] = record['grade']
+                ranks[record['id']] = record['rank']
+            else:
+                r['response'] = record['text']
+    return sorted(final.values(), key=lambda r: ranks.get(r['id'], r['id']))
+
+async def main(num_iterations):
     """
     Entry point for the Llama 3.1 70B model example.
     """
@@ -80,6 +351,7 @@ def main(num_iterations):
 
     # System prompts to guide the model's behavior
     system_prompts = [{"text": "You are a highly technical assistant providing concise and accurate reports on complex deep learning topics."}]
+    refinement_system_prompts = system_prompts + [{"text": REFINEMENT_INSTRUCTION}]
 
     # Initial message to start the conversation
     message_1 = {
@@ -88,80 +360,125 @@ def main(num_iterations):
     }
 
     try:
-        # Initialize the Bedrock runtime client
-        bedrock_client = boto3.client(service_name='bedrock-runtime')
+        # Initialize the Bedrock runtime client, shared by every call. The pool is sized well
+        # above the fan-out so kept-alive TLS connections are reused rather than re-opened,
+        # and adaptive retries back off on ThrottlingException when it hits the TPS quota
+        client_config = Config(
+            max_pool_connections=32,
+            retries={'max_attempts': 10, 'mode': 'adaptive'},
+            tcp_keepalive=True
+        )
+        session = aioboto3.Session()
 
-        # Timing start for the overall process
-        start_time = time.time()
+        # Wall clock time of the run start, for the summary only. Intervals are measured with the
+        # monotonic, higher resolution perf_counter so clock adjustments cannot skew them
+        run_started = time.time()
+        start_time = time.perf_counter()
 
-        # Open the file in write mode to empty it before writing
-        with open('response.txt', 'w') as file:
+        # The summaries are rewritten at the end of the run, remove the previous run's now so a
+        # crash cannot leave them next to this run's log
+        for path in ('response.txt', 'summary.json'):
+            if os.path.exists(path):
+                os.remove(path)
+
+        async with session.client(service_name='bedrock-runtime', config=client_config) as bedrock_client:
+            # Each response, review and refinement is appended to the log as soon as it completes,
+            # so a crash mid-run keeps everything produced so far
+            with open('response.jsonl', 'wb', buffering=0) as log:
+
+                def _log(**record):
+                    log.write(orjson.dumps(record) + b"\n")
+
+                # Generate initial responses (3 responses) concurrently; the calls are
+                # independent and I/O bound, so their network round trips overlap
+                messages = [message_1]
+
+                async def _gen_one(response_id):
+                    response, response_time_taken = await _timed(generate_conversation, bedrock_client, model_id, system_prompts, messages, 1024)
+                    response_text = response['output']['message']['content'][0]['text']
+                    _log(kind="response", id=response_id, text=response_text, elapsed=response_time_taken)
+                    return {"id": response_id, "response": response_text, "feedback": None, "grade": None, "time_taken": response_time_taken}
+
+                responses = list(await asyncio.gather(*[_gen_one(i) for i in range(3)]))
+
+                async def _refine(r, iteration):
+                    refinement_prompt = {
+                        "role": "user",
+                        "content": [{"text": r['response']}]
+                    }
+                    # A little variety keeps refinement from stalling, but far less than the seed generations.
+                    # A refinement of a near-identical response is as good as a fresh one, so it may come
+                    # from the semantic cache
+                    refined_response, refinement_time_taken = await _timed(generate_conversation, bedrock_client, model_id, refinement_system_prompts, [refinement_prompt], 1024,
+                                                                           temperature=0.2, semantic=True)
+                    refined_text = refined_response['output']['message']['content'][0]['text']
+                    _log(kind="refinement", iter=iteration, id=r['id'], text=refined_text, elapsed=refinement_time_taken)
+                    return refined_text
+
+                # Perform feedback and grading in each iteration
+                review_time_taken = 0.0
+                for iteration in range(num_iterations):
+                    logger.info(f"Iteration {iteration + 1}")
+
+                    # One call reviews every response, the candidates share a single context
+                    reviews, review_time_taken = await _timed(batch_feedback_and_grade, bedrock_client, model_id, [r['response'] for r in responses], system_prompts)
+                    for r, (feedback, grade) in zip(responses, reviews):
+                        r['feedback'] = feedback
+                        r['grade'] = grade
 
-            # Generate initial responses (3 responses)
-            messages = [message_1]
-            responses = []
-            for i in range(3):
-                response_start_time = time.time()
-                response = generate_conversation(bedrock_client, model_id, system_prompts, messages, max_gen_len=1024)
-                response_text = response['output']['message']['content'][0]['text']
-                response_time_taken = time.time() - response_start_time
-                responses.append({"response": response_text, "feedback": None, "grade": None, "time_taken": response_time_taken})
-
-            # Perform feedback and grading in each iteration
-            for iteration in range(num_iterations):
-                logger.info(f"Iteration {iteration + 1}")
-                for i, r in enumerate(responses):
-                    # Get feedback for the response
-                    feedback_start_time = time.time()
-                    feedback = get_feedback(bedrock_client, model_id, r['response'], system_prompts)
-                    feedback_time_taken = time.time() - feedback_start_time
-                    responses[i]['feedback'] = feedback
-                    responses[i]['feedback_time_taken'] = feedback_time_taken
-
-                    # Grade the response based on feedback
-                    grade_start_time = time.time()
-                    grade = grade_response(bedrock_client, model_id, r['response'], feedback, system_prompts)
-                    grade_time_taken = time.time() - grade_start_time
-                    responses[i]['grade'] = grade
-                    responses[i]['grade_time_taken'] = grade_time_taken
-
-                # Sort responses by grade and refine the best response for the next iteration
-                responses = sorted(responses, key=lambda x: x['grade'], reverse=True)
-
-                logger.info(f"Best response at iteration {iteration + 1}: {responses[0]['response']} (Grade: {responses[0]['grade']})")
-
-                # Optionally, refine the top response for the next iteration
-                best_response = responses[0]['response']
-                refinement_prompt = {
-                    "role": "user",
-                    "content": [{"text": f"Refine the following response to make it more concise and technical but retain information:\n\n{best_response}"}]
-                }
-                refined_response = generate_conversation(bedrock_client, model_id, system_prompts, [refinement_prompt], max_gen_len=1024)
-                refined_text = refined_response['output']['message']['content'][0]['text']
-                responses[0]['response'] = refined_text
-
-            # Timing end for the overall process
-            total_time_taken = time.time() - start_time
-
-            # Write the summary to the file
+                    # Sort responses by grade and refine the best response for the next iteration
+                    responses = sorted(responses, key=lambda x: x['grade'], reverse=True)
+                    for rank, r in enumerate(responses):
+                        _log(kind="review", iter=iteration, id=r['id'], rank=rank, feedback=r['feedback'], grade=r['grade'], elapsed=review_time_taken)
+
+                    logger.info(f"Best response at iteration {iteration + 1}: {responses[0]['response']} (Grade: {responses[0]['grade']})")
+
+                    # Optionally, refine the top response for the next iteration
+                    responses[0]['response'] = await _refine(responses[0], iteration)
+
+        # Timing end for the overall process
+        total_time_taken = time.perf_counter() - start_time
+
+        # The summaries are built from the log rather than the in-memory responses, so they show
+        # exactly what was recorded during the run
+        responses = _summarize_log('response.jsonl')
+
+        # Write the human readable summary of the final responses
+        with open('response.txt', 'w') as file:
             file.write("\nSUMMARY OF PROCESS\n")
             file.write("=" * 40 + "\n")
+            file.write(f"Run started: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run_started))}\n")
             file.write(f"Total time taken for the process: {total_time_taken:.2f} seconds\n")
-            for i, r in enumerate(responses):
-                file.write(f"\nResponse {i + 1}:\n")
+            file.write(f"Feedback and grading time (last iteration): {review_time_taken:.2f} seconds\n")
+            # Responses are listed best first but numbered by id, as in response.jsonl
+            for r in responses:
+                file.write(f"\nResponse {r['id'] + 1}:\n")
                 file.write(f"Response: {r['response']}\n")
                 file.write(f"Feedback: {r['feedback']}\n")
                 file.write(f"Grade: {r['grade']}\n")
                 file.write(f"Response generation time: {r['time_taken']:.2f} seconds\n")
-                file.write(f"Feedback generation time: {r['feedback_time_taken']:.2f} seconds\n")
-                file.write(f"Grading time: {r['grade_time_taken']:.2f} seconds\n")
             file.write("=" * 40 + "\n")
-            file.write(f"Best response: {responses[0]['response']} (Grade: {responses[0]['grade']})\n")
+            file.write(f"Best response (response {responses[0]['id'] + 1}): {responses[0]['response']} (Grade: {responses[0]['grade']})\n")
+
+        # The same summary as structured data, for htmlize.py
+        with open('summary.json', 'wb') as file:
+            file.write(orjson.dumps({
+                "started": run_started,
+                "total_time": total_time_taken,
+                "review_time": review_time_taken,
+                "responses": responses,
+                "best": {"id": responses[0]['id'], "response": responses[0]['response'], "grade": responses[0]['grade']}
+            }))
 
     except ClientError as err:
         logger.error(f"A client error occurred: {err.response['Error']['Message']}")
         print(f"A client error occurred: {err.response['Error']['Message']}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-cache", action="store_true", help="always call the model instead of reusing cached responses")
+    args = parser.parse_args()
+    llm_cache.enabled = not args.no_cache
+
     num_iterations = 3  # Set the number of iterations
-    main(num_iterations)
+    asyncio.run(main(num_iterations))
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import orjson
+
+import llm_cache
+
+# Semantic caching is optional, it needs sentence-transformers and faiss
+try:
+    import faiss
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    faiss = None
+
+INDEX_PATH = os.path.join(llm_cache.CACHE_DIR, 'semantic.faiss')
+MODEL_NAME = 'all-MiniLM-L6-v2'
+SIMILARITY_THRESHOLD = 0.92
+TOP_K = 5  # Neighbours to check, the nearest one may belong to a different request shape
+
+# The embedder and index are loaded lazily and shared between threads
+_lock = threading.Lock()
+_embedder = None
+_index = None
+
+def available():
+    """
+    Return True if the optional semantic cache dependencies are installed.
+    """
+    return faiss is not None
+
+def _connect():
+    """
+    Open the cache database, creating the semantic table on first use.
+    """
+    os.makedirs(llm_cache.CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(llm_cache.DB_PATH)
+    conn.execute("CREATE TABLE IF NOT EXISTS semantic (id INTEGER PRIMARY KEY, shape TEXT, value BLOB, ts INTEGER)")
+    return conn
+
+def _load():
+    """
+    Load the embedding model and the persisted index. Must be called with _lock held.
+    """
+    global _embedder, _index
+    if _embedder is None:
+        _embedder = SentenceTransformer(MODEL_NAME)
+        if os.path.exists(INDEX_PATH):
+            _index = faiss.read_index(INDEX_PATH)
+        else:
+            # Inner product over normalized embeddings is cosine similarity
+            _index = faiss.IndexIDMap(faiss.IndexFlatIP(_embedder.get_sentence_embedding_dimension()))
+
+def _embed(text):
+    """
+    Embed text, or return None if it does not fit the model's input window. The model would
+    silently truncate it, and prompts sharing only their opening would then look identical.
+    Must be called with _lock held.
+    """
+    if len(_embedder.tokenizer(text)['input_ids']) > _embedder.max_seq_length:
+        return None
+    return _embedder.encode([text], normalize_embeddings=True).astype(np.float32)
+
+def get(text, shape):
+    """
+    Return the cached response dict for the nearest prompt with the same shape, or None
+    if nothing is above SIMILARITY_THRESHOLD or the prompt is too long to embed.
+    """
+    with _lock:
+        _load()
+        if _index.ntotal == 0:
+            return None
+        embedding = _embed(text)
+        if embedding is None:
+            return None
+        scores, ids = _index.search(embedding, TOP_K)
+
+    candidates = [int(i) for score, i in zip(scores[0], ids[0]) if i != -1 and score > SIMILARITY_THRESHOLD]
+    with closing(_connect()) as conn:
+        for i in candidates:
+            row = conn.execute("SELECT value FROM semantic WHERE id = ? AND shape = ?", (i, shape)).fetchone()
+            if row:
+                return orjson.loads(row[0])
+    return None
+
+def set(text, shape, value):
+    """
+    Store the response dict value for the prompt text. Prompts too long to embed are skipped.
+    """
+    with _lock:
+        _load()
+        embedding = _embed(text)
+    if embedding is None:
+        return
+
+    with closing(_connect()) as conn, conn:
+        row_id = conn.execute(
+            "INSERT INTO semantic (shape, value, ts) VALUES (?, ?, ?)",
+            (shape, orjson.dumps(value), int(time.time()))
+        ).lastrowid
+
+    with _lock:
+        _index.add_with_ids(embedding, np.array([row_id], dtype=np.int64))
+        faiss.write_index(_index, INDEX_PATH)